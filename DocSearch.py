@@ -1,312 +1,434 @@
 import numpy as np
-import math
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from scipy import sparse
 from multiprocessing import Pool, cpu_count
+from collections import defaultdict
+from functools import lru_cache
 
 
-def read_file(filepath: str) -> str:
+def read_file(filepath: str) -> bytes:
     """
-    read_file function reads in the given file and returns a string containing the files contents.\n
+    read_file function reads in the given file and returns a bytes object containing the files contents.\n
+    The file is read in binary mode, the contents are kept as bytes rather than decoded to a string.\n
     @param filepath - The path of the file to read.
-    @return - String containing the contents of the file
+    @return - Bytes containing the contents of the file
     """
 
     # Assign default return value
-    retval = ""
+    retval = b""
 
     # Try to open file and read contents
     try:
-        with open(filepath, "r") as file:
+        with open(filepath, "rb", buffering=1 << 20) as file:
             retval = file.read()
     except FileNotFoundError as e:
         print(e)
     finally:
-        # Return string of file
+        # Return bytes of file
         return retval
 
 
-def build_doc_dict(doc: list) -> dict:
+def build_vocab(words: list) -> dict:
     """
-    Create a dict containing the count of each word in the given document.\n
-    @param doc - The doc to create a dict for (as a list)
-    @return - A dict containing the count of each word in the given document
+    Assign each distinct word an integer ID, in the order the words first appear.\n
+    The ID of a word is also its column in the document vectors.\n
+    @param words - The list of all words in the corpus\n
+    @return - A dict mapping each word to its ID
     """
 
-    output = dict()
+    return {word: i for i, word in enumerate(dict.fromkeys(words))}
 
-    # Go through the document by word
-    for word in doc:
-        # If the word has already been counted, ignore it
-        if not(word in output):
-            output[word] = doc.count(word)
 
-    return output
-
-
-def build_corpus_dict(docs: list) -> dict:
+def build_word_ids(words: list, vocab: dict) -> np.array:
     """
-    Should be passed the list of doc dicts.\n
-    Will combine them and return a dictionary of the occurances of words in the whole corpus\n
-    @param docs - List of dicts (as generated by convert_docs)\n
-    @return - A dict containg all the data from all doc dicts.
+    Convert a list of words into an array of their IDs.\n
+    Words that are not in the vocab are skipped.\n
+    @param words - The list of words to convert\n
+    @param vocab - The word to ID mapping (as generated by build_vocab)\n
+    @return - An int32 numpy array containing the ID of each word
     """
 
-    # Initalise empty dict for storing return value
-    output = dict()
-
-    for doc in docs:
-        # Merge the dicts
-        for word in doc:
-            if word in output:
-                output[word] += doc[word]
-            else:
-                output[word] = doc[word]
+    return np.fromiter((vocab[word] for word in words if word in vocab), dtype=np.int32)
 
-    return output
 
-
-def build_index_for(word_list: list, docs: list) -> dict:
-    """Builds the inverted index for a list of worlds\n
+def build_index_for(docs: list, start_id: int) -> dict:
+    """Builds the inverted index for a contiguous chunk of documents\n
     This is intended to be called by a multiprocessing.Pool object.\n
-    @param word_list - The list of words to be built for\n
-    @param docs - The list of documents to be searched through (should be a list of strings).\n
-    @return - An inverted index dict for the given word list"""
-
-    # Build the inverted index dict
-    inverted_index = dict()
-    for word in word_list:
-        # Create empty list for storing document ID's
-        inverted_index[word] = []
-        # For each document, check if the word is present. If it is, add that document's ID to the index.
-        for i in range(len(docs)):
-            doc = docs[i]
-            if word in doc:
-                # Append the ID to the index
-                inverted_index[word].append(i)
+    @param docs - The chunk of documents to index (should be a slice of the list of word ID arrays from build_doc_word_ids).\n
+    @param start_id - The document ID of the first document in the chunk.\n
+    @return - An inverted index dict of word ID to document IDs, for the words in the given documents"""
 
-    return inverted_index
+    # Build the inverted index dict in a single pass over the documents
+    # Each word ID is only taken once per document, so each document ID is only added once per word
+    inverted_index = defaultdict(list)
+    for i, doc in enumerate(docs, start_id):
+        for word_id in np.unique(doc).tolist():
+            inverted_index[word_id].append(i)
+
+    return dict(inverted_index)
 
 
-def build_inverted_index(docs: list, corpus_dict: dict) -> dict:
+def build_inverted_index(docs: list, vocab_size: int) -> list:
     """
     Build the inverted index for each doc in the corps\n
-    @param docs - The documents string read from the docs.txt file. Each line is assumed to be a document.
-    @param corpus_dict - The dict for all words in the corpus
+    @param docs - The list of word ID arrays (as generated by build_doc_word_ids).
+    @param vocab_size - The number of words in the corpus
+    @return - A list containing the array of document IDs for each word, indexed by word ID
     """
 
-    # Initalise inverted_index as an empty dict
-    inverted_index = dict()
+    # Initalise inverted_index with an empty list for every word
+    inverted_index = [[] for _ in range(vocab_size)]
 
     # Create a multiprocessing pool for making the index
     pool = Pool()
     cpu_num = cpu_count()
 
-    # Build list of words
-    word_list = []
-    for word in corpus_dict:
-        word_list.append(word)
+    # Split the documents into a number of contiguous chunks to process on different processes using a Pool
+    # The work for a document is proportional to its number of words, so each chunk gets roughly the same number of words rather than documents
+    # There are several chunks per process, so a process that finishes early picks up another chunk instead of waiting on the slowest one
+    chunk_num = cpu_num * 4
+    word_totals = np.cumsum([len(doc) for doc in docs])
+    chunk_bounds = np.searchsorted(word_totals, np.linspace(0, word_totals[-1], chunk_num + 1)[1:-1], side="right")
+    chunk_bounds = [0] + chunk_bounds.tolist() + [len(docs)]
 
-    # Split the inverted index into a number of separte lists of words to process on different processes using a Pool
     # Results objects are stored in this results list
     results = []
-    for i in range(cpu_num):
-        # To ensure we get all words contained in the processes, start_index is rounded down, and end_index is rounded up
-        start_index = round((i * (len(word_list) / cpu_num)) - 0.5)
-        end_index = round((start_index + (len(word_list) / cpu_num)) + 0.5)
-        process_word_list = word_list[start_index:end_index]
+    for i in range(chunk_num):
+        # The chunks must not overlap, otherwise a document would be added to the index twice
+        start_index = chunk_bounds[i]
+        end_index = chunk_bounds[i + 1]
         results.append(pool.apply_async(
-            build_index_for, args=(process_word_list, docs)))
+            build_index_for, args=(docs[start_index:end_index], start_index)))
 
     # For each result, call .get() on it to wait for the results
+    # The results are merged in chunk order, so the document IDs for each word stay sorted
     for result in results:
         partial_index = result.get()
         # Copy the data from the generated partial index, and put it in the full inverted index
-        for word in partial_index:
-            inverted_index[word] = partial_index[word]
+        for word_id in partial_index:
+            inverted_index[word_id].extend(partial_index[word_id])
 
     # Close multithreading pool
     pool.close()
 
+    # Store each list of document IDs as a contiguous int32 array, they are already sorted by construction
+    for word_id in range(vocab_size):
+        doc_ids = inverted_index[word_id]
+        inverted_index[word_id] = np.fromiter(doc_ids, dtype=np.int32, count=len(doc_ids))
+
     # Return our result
     return inverted_index
 
-# This function would be a local one within process query, but due to the use of multithreading it HAS to be outside a local scope
 
+def build_doc_matrix(docs: list, vocab_size: int) -> sparse.csr_matrix:
+    """
+    Stack the word ID arrays into a sparse matrix, with one row per document and one column per word.\n
+    Each row is equivalent to np.bincount of the document's word IDs, without storing the zeros.\n
+    @param docs - The list of word ID arrays (as generated by build_doc_word_ids)\n
+    @param vocab_size - The number of words in the corpus, which is the number of columns.\n
+    @return - A CSR matrix containing the count of each word in each document
+    """
+
+    # The row pointer marks where each document's words start in the flattened word ID array
+    row_ptr = np.zeros(len(docs) + 1, dtype=np.int32)
+    np.cumsum([len(doc) for doc in docs], out=row_ptr[1:])
 
-def build_vector(doc: dict, inverted_index: dict) -> np.array:
-    """Build the vector for the given document.\n
-    @param doc - The document to build the array for.\n
-    @param inverted_index - The index to build it from."""
+    # Every word is entered with a count of 1, and repeated words in the same document are then summed into a single entry
+    word_ids = np.concatenate(docs)
+    doc_matrix = sparse.csr_matrix((np.ones_like(word_ids), word_ids, row_ptr), shape=(len(docs), vocab_size), dtype=np.int32)
+    doc_matrix.sum_duplicates()
 
-    temp_list = []
+    return doc_matrix
 
-    # For each word in the index, append the count of that word in the document to the list
-    for word in inverted_index:
-        try:
-            temp_list.append(doc[word])
-        except KeyError:
-            temp_list.append(0)
 
-    # Turn the list into a vector
-    vector = np.array(temp_list)
-    return vector
+def build_doc_norms(doc_matrix: sparse.csr_matrix) -> np.array:
+    """
+    Calculate the norm of every document vector in the matrix.\n
+    @param doc_matrix - The document matrix (as generated by build_doc_matrix)\n
+    @return - An array containing the norm of each document, indexed by document ID
+    """
 
-# This function would be a local one within process query, but due to the use of multithreading it HAS to be outside a local scope
+    # The counts are converted to floats first, squaring large int32 counts would overflow
+    doc_matrix = doc_matrix.astype(np.float64)
+    return np.sqrt(doc_matrix.multiply(doc_matrix).sum(axis=1)).A1
 
 
-def calc_angles(relevant_docs: list, docs: list, inverted_index: dict, query: str) -> dict:
+def calc_angles(relevant_docs: np.array, dot_products: sparse.csr_matrix, doc_norms: np.array, query_norm: float) -> np.array:
     """Calculate the angles between the query and the given docs.\n
-    @param relevant_docs - A list of relevant document IDs\n
-    @param docs - The documents to use (list of srtings)\n
-    @param inverted_index - The inverted index for this corpus.\n
-    @param query - The query to compare to.
+    @param relevant_docs - An array of relevant document IDs\n
+    @param dot_products - A sparse row containing the dot product of every document with the query (with sorted indices), indexed by document ID\n
+    @param doc_norms - The norm of each document (as generated by build_doc_norms)\n
+    @param query_norm - The norm of the query vector.\n
+    @return - An array containing the angle of each relevant document in degrees, in the same order as relevant_docs
     """
 
-    # Build the vector for the search query
-    query_vector = build_vector(build_doc_dict(query.split()), inverted_index)
-    query_norm = np.linalg.norm(query_vector)
+    # Look up the dot product of each relevant document by binary searching the stored entries of the row
+    # Only the relevant documents are looked up, documents with no stored entry have a dot product of 0
+    positions = np.searchsorted(dot_products.indices, relevant_docs)
+    found = positions < len(dot_products.indices)
+    found[found] = dot_products.indices[positions[found]] == relevant_docs[found]
+    relevant_dot_products = np.zeros(len(relevant_docs), dtype=np.float64)
+    relevant_dot_products[found] = dot_products.data[positions[found]]
+
+    # Calculate the cosine of each angle, clipped to [-1, 1] as rounding can push it slightly outside the domain of arccos
+    cosines = np.clip(relevant_dot_products / (doc_norms[relevant_docs] * query_norm), -1.0, 1.0)
+
+    # Calculate the angles in radians, and convert to degrees
+    return np.degrees(np.arccos(cosines))
+
+
+def answer_query(query_key: tuple, inverted_index: list, dot_products: sparse.csr_matrix, doc_norms: np.array, query_norm: float) -> tuple:
+    """
+    Find the relevant documents for a query and the angle between each of them and the query.\n
+    @param query_key - The sorted word IDs of the query (words that are not in the vocab are left out).\n
+    @param inverted_index - A list containing the inverted index for the corpus, indexed by word ID.\n
+    @param dot_products - A sparse row containing the dot product of every document with the query (with sorted indices), indexed by document ID\n
+    @param doc_norms - The norm of each document (as generated by build_doc_norms)\n
+    @param query_norm - The norm of the query vector\n
+    @return - A tuple of the output lines for the query: the relevant documents line, then one line per document
+    """
 
-    # Create a dict to store the angles in
-    angle_dict = dict()
+    # Look up the array of document IDs for each query word once
+    # The arrays are sorted so the words with the fewest documents are intersected first, to keep the relevant_docs array small
+    posting_arrays = [inverted_index[word_id] for word_id in query_key]
+    posting_arrays.sort(key=len)
 
-    # For each document, print its ID and the angle between it and the search query
-    for docID in relevant_docs:
-        vector = build_vector(docs[docID], inverted_index)
-        dot_product = np.dot(vector, query_vector)
-        norm = np.linalg.norm(vector)
+    # Use a sorted array to store the relevant documents, without any duplicates
+    if len(posting_arrays) > 0:
+        # Intersect the current relevant_docs array with the array of each remaining word
+        # Once no documents are left, intersecting any further can't add any back, so stop early
+        relevant_docs = posting_arrays[0]
+        for doc_ids in posting_arrays[1:]:
+            if len(relevant_docs) == 0:
+                break
+            relevant_docs = np.intersect1d(relevant_docs, doc_ids, assume_unique=True)
+    else:
+        # If none of the query words are indexed, the array contains the ID of all documents in the docs list
+        relevant_docs = np.arange(len(doc_norms), dtype=np.int32)
 
-        # Calculate angle in radians
-        angle = np.arccos(dot_product / (norm * query_norm))
+    # Add the list or relevant documents in the right format, separated by whitespace
+    lines = ["Relevant documents: " + " ".join(map(str, relevant_docs.tolist()))]
 
-        # Convert to degrees
-        angle = math.degrees(angle)
+    # Calculate the angle between the query and each relevant document
+    angles = calc_angles(relevant_docs, dot_products, doc_norms, query_norm)
 
-        # Append the angle to the list
-        angle_dict[docID] = angle
+    # Add the document results
+    # The angles are sorted so the most relevant docIDs are printed first, a stable sort keeps equal angles in docID order
+    for i in np.argsort(angles, kind="stable"):
+        lines.append(f"{relevant_docs[i]} {angles[i]:.5f}")
 
-    # Return the results
-    return angle_dict
+    return tuple(lines)
 
 
-def process_query(query: str, inverted_index: dict, docs: list, pool: Pool) -> None:
+def process_query(query: bytes, answer: tuple) -> None:
     """
-    Process a given query and print the results. This is intended to be called via process_queries but can be called standalone assuming you create a Pool object for it\n
+    Print the results of a given query. This is intended to be called via process_queries\n
     1 - Print the query 'Query: {query}'\n
     2 - Print a list of the relevant documents in form '{doc1} {doc2} {etc}'\n
     3 - For each document in the list, print '{docID} {Angle compared to the search query}'\n
-    @param query - The query to be searched: should be str.\n
-    @param inverted_index - A dict contain the inverted index for the corpus.\n
-    @param docs - The documents to search through, as a list of strings\n
-    @param pool - A multhprocessing.Pool object, used to process angle calculation in parallel.
+    @param query - The query that was searched: should be bytes.\n
+    @param answer - The output lines for the query (as generated by answer_query)
     """
-    print(f"Query: {query}")
 
-    # Split the query into a list of words to prevent crossover when using in operator
-    query_split = query.split()
+    # Print all of the lines with a single write
+    # The query is only decoded for printing, bytes that aren't valid UTF-8 are replaced rather than stopping the output
+    sys.stdout.write(f"Query: {query.decode(errors='replace')}\n" + "\n".join(answer) + "\n")
 
-    # Use a set to store the relevant documents, to prevent any duplicates
-    # Starting set contains the ID of all documents in the docs list
-    relevant_docs = set([i for i in range(len(docs))])
 
-    # Attempt to intersection the current relevant_docs set with the set of the inverted index for the current word
-    # If it is not present in the inverted index, catch the raised NameError
-    for word in query_split:
-        try:
-            relevant_docs.intersection_update(inverted_index[word])
-        except KeyError:
-            pass
+def process_queries(queries: bytes, inverted_index: list, vocab: dict, doc_matrix: sparse.csr_matrix, doc_norms: np.array) -> None:
+    """
+    Process a number of queries.\n
+    Queries containing the same words are only answered once.\n
+    @param queries - The bytes of the queries, each query should be separted by a new line.\n
+    @param inverted_index - A list containing the inverted index for the corpus, indexed by word ID.\n
+    @param vocab - The word to ID mapping for the corpus.\n
+    @param doc_matrix - The matrix of the documents to search through (as generated by build_doc_matrix)\n
+    @param doc_norms - The norm of each document (as generated by build_doc_norms)
+    """
 
-    # Print the list or relevant documents in the right format
-    print("Relevant documents: ", end="")
-    # This line unpacks all the items from the list and prints them separated by whitespace.
-    print(*relevant_docs, sep=" ", end="\n")
+    # Split the queries by newline character
+    queries = queries.splitlines()
+    if len(queries) == 0:
+        return
+
+    # The order of the words in a query doesn't affect its results, so each query is keyed by its sorted word IDs
+    # Repeated words are kept in the key, as they change the query vector
+    query_keys = [tuple(sorted(build_word_ids(query.split(), vocab).tolist())) for query in queries]
+
+    # Only the distinct query keys need a row in the query matrix
+    key_rows = {key: i for i, key in enumerate(dict.fromkeys(query_keys))}
+
+    # Build the vectors for all of the distinct queries at once
+    query_word_ids = [np.array(key, dtype=np.int32) for key in key_rows]
+    query_matrix = build_doc_matrix(query_word_ids, len(vocab))
+    query_norms = build_doc_norms(query_matrix)
+
+    # Calculate the dot product of every query with every document in one sparse matrix multiply, in floats so large counts can't overflow
+    # Row i contains the dot products for query i, indexed by document ID, and is kept sparse so only the relevant documents are looked up
+    dot_products = query_matrix.astype(np.float64) @ doc_matrix.T
+    dot_products = sparse.csr_matrix(dot_products)
+    dot_products.sort_indices()
+
+    # Answers are cached by query key, so a repeated query is only answered once
+    # The index doesn't change while the queries are processed, so a cached answer is always still valid
+    @lru_cache(maxsize=1024)
+    def cached_answer(query_key: tuple) -> tuple:
+        row = key_rows[query_key]
+        return answer_query(query_key, inverted_index, dot_products[row], doc_norms, query_norms[row])
 
-    # Initalise empty dict to store angles
-    angle_dict = dict()
+    # Process each query serially
+    for query, query_key in zip(queries, query_keys):
+        process_query(query, cached_answer(query_key))
 
-    # Results objects are stored in this results list
-    results = []
 
-    # Relevant docs must be converted to a list to allow for indexing for this step
-    relevant_docs = list(relevant_docs)
+def tokenize_docs(docs: bytes) -> tuple:
+    """
+    Split the bytes of docs into words, and find the document each word belongs to. Each line is assumed to be a document.\n
+    The whole string is tokenized at once, and each word is assigned to a document by binary searching its position among the newlines.\n
+    @param docs - The bytes to tokenize\n
+    @return - A tuple of (words, doc_ids, num_docs), where doc_ids[i] is the ID of the document containing words[i] (indexed from 1)
+    """
 
-    # Get cpu number
-    cpu_num = cpu_count()
+    characters = np.frombuffer(docs, dtype=np.uint8)
 
-    for i in range(cpu_num):
-        # To ensure we get all words contained in the processes, start_index is rounded down, and end_index is rounded up
-        start_index = round((i * (len(relevant_docs) / cpu_num)) - 0.5)
-        end_index = round((start_index + (len(relevant_docs) / cpu_num)) + 0.5)
+    # Find the position of every newline, these are the boundaries between documents
+    newline_pos = np.flatnonzero(characters == ord("\n"))
 
-        # Create the smaller doc_list as a sub-list of the main relevant docs list
-        doc_list = relevant_docs[start_index:end_index]
+    # A final line without a trailing newline is still a document
+    num_docs = len(newline_pos)
+    if len(docs) > 0 and docs[-1] != ord("\n"):
+        num_docs += 1
 
-        # Call the pool for each documents sub-list
-        results.append(pool.apply_async(calc_angles, args=(
-            doc_list, docs, inverted_index, query)))
+    # Tokenize the whole buffer at once with the regex engine, the words are kept as bytes
+    words = re.findall(rb"\S+", docs)
 
-    # For each result, call .get() on it to wait for the results
-    for result in results:
-        angle_return = result.get()
+    # A word starts at every non-whitespace character that follows whitespace (or the start of the buffer)
+    in_word = ~np.isin(characters, np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8))
+    word_pos = np.flatnonzero(in_word & ~np.concatenate(([False], in_word[:-1])))
 
-        # Copy the data from each angle_return dict into the main one
-        for docID in angle_return:
-            angle_dict[docID] = angle_return[docID]
+    # The number of newlines before a word is the index of the line it is on
+    doc_ids = np.searchsorted(newline_pos, word_pos) + 1
 
-    # Print the document results
-    # The dict is sorted so the most relevant docIDs are printed first
-    for docID in sorted(angle_dict, key=angle_dict.__getitem__):
-        print(f"{docID} {format(angle_dict[docID], '.5f')}")
+    return words, doc_ids, num_docs
 
 
-def process_queries(queries: str, inverted_index: dict, docs: str) -> None:
+def build_doc_word_ids(docs: bytes) -> tuple:
     """
-    Process a number of queries.\n
-    @param queries - A string of queries, each query should be separted by a new line.\n
-    @param inverted_index - A dict contain the inverted index for the corpus.\n
-    @param docs - The documents to search through, as a string. Each document is separated by a newline\n
-    @param pool - A multithreading pool to carry out calculations on.
+    Converts the bytes of docs into a list of arrays. Each array contains the ID of each word in the document, in order.
+    @param docs - The bytes to convert
+    @return - A tuple of (docs, vocab), where vocab is the word to ID mapping (as generated by build_vocab)
     """
 
-    # Define the pool object up here to reduce the overhead from constantly creating a new object
-    pool = Pool()
+    words, doc_ids, num_docs = tokenize_docs(docs)
 
-    # Split the queries and docs by newline character
-    queries = queries.splitlines()
+    # Intern every word as an integer ID
+    vocab = build_vocab(words)
+    word_ids = build_word_ids(words, vocab)
 
-    # Process each query serially
-    for query in queries:
-        process_query(query, inverted_index, docs, pool)
+    # The doc IDs are in ascending order, so find where the words of each document start and end
+    bounds = np.searchsorted(doc_ids, np.arange(1, num_docs + 2))
 
-    # Close the pool object
-    pool.close()
+    # Add an empty document to the 0th element, so that the document list is indexed from 1.
+    # The empty starting array at 0 has no impact on the queries as it won't be present in the inverted index anyway
+    docs = [np.empty(0, dtype=np.int32)]
+
+    for i in range(num_docs):
+        docs.append(word_ids[bounds[i]:bounds[i + 1]])
 
+    return docs, vocab
+
+
+def save_index(index_path: str, docs_stat: os.stat_result, vocab: dict, doc_matrix: sparse.csr_matrix, doc_norms: np.array) -> None:
+    """
+    Save the built index to disk, so it can be loaded by load_index instead of being rebuilt on the next run.\n
+    The size and modification time of the docs file are saved with it, so the saved index can be detected as out of date.\n
+    @param index_path - The path of the .npz file to save to\n
+    @param docs_stat - The os.stat result of the docs file, taken before it was read to build the index\n
+    @param vocab - The word to ID mapping for the corpus\n
+    @param doc_matrix - The document matrix (as generated by build_doc_matrix)\n
+    @param doc_norms - The norm of each document (as generated by build_doc_norms)
+    """
 
-def build_doc_dicts(docs: str) -> list:
+    # Write to a temporary file first and move it into place, so an interrupted save can't leave a truncated index behind
+    index_dir = os.path.dirname(index_path) or "."
+    temp_path = None
+    try:
+        temp_fd, temp_path = tempfile.mkstemp(dir=index_dir, prefix=os.path.basename(index_path) + ".", suffix=".tmp")
+        with os.fdopen(temp_fd, "wb") as file:
+            np.savez(file,
+                     docs_stat=np.array([docs_stat.st_size, docs_stat.st_mtime_ns], dtype=np.int64),
+                     vocab=np.frombuffer(b"\n".join(vocab), dtype=np.uint8),
+                     indptr=doc_matrix.indptr, indices=doc_matrix.indices, data=doc_matrix.data,
+                     shape=np.array(doc_matrix.shape), doc_norms=doc_norms)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        # The saved index is only a cache, so a failed save is reported on stderr to keep it out of the query results
+        print(e, file=sys.stderr)
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_index(index_path: str, docs_path: str) -> tuple:
     """
-    Converts the string of docs into a list of dicts. The dict contains the number of occurances of each word in the dict.
-    @param docs - The string to convert
+    Load an index saved by save_index, if it is still up to date with the docs file.\n
+    @param index_path - The path of the .npz file to load from\n
+    @param docs_path - The path of the docs file the index should have been built from\n
+    @return - A tuple of (inverted_index, vocab, doc_matrix, doc_norms), or None if there is no up to date saved index
     """
 
-    # Split documents by line
-    docs = docs.splitlines()
+    try:
+        docs_stat = os.stat(docs_path)
+        with np.load(index_path) as saved:
+            # If the docs file has changed since the index was saved, it must be rebuilt
+            if saved["docs_stat"].tolist() != [docs_stat.st_size, docs_stat.st_mtime_ns]:
+                return None
+
+            # The vocab is saved as the words joined by newlines, words never contain whitespace so this can be split losslessly
+            vocab_bytes = saved["vocab"].tobytes()
+            words = vocab_bytes.split(b"\n") if len(vocab_bytes) > 0 else []
+            doc_matrix = sparse.csr_matrix((saved["data"], saved["indices"], saved["indptr"]), shape=tuple(saved["shape"]))
+            doc_norms = saved["doc_norms"]
+    except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+        # A missing, unreadable or incomplete saved index is treated as if there was no saved index, so it gets rebuilt
+        return None
 
-    for i in range(len(docs)):
-        docs[i] = build_doc_dict(docs[i].split())
+    vocab = {word: i for i, word in enumerate(words)}
 
-    # Add an empty document to the 0th element, so that the document list is indexed from 1.
-    # The empty starting dict at 0 has no impact on the queries as it won't be present in the inverted index anyway
-    docs = [dict()] + docs
+    # The document IDs containing each word are the rows of that word's column in the matrix
+    doc_matrix_csc = doc_matrix.tocsc()
+    doc_matrix_csc.sort_indices()
+    inverted_index = []
+    for word_id in range(len(vocab)):
+        inverted_index.append(doc_matrix_csc.indices[doc_matrix_csc.indptr[word_id]:doc_matrix_csc.indptr[word_id + 1]])
 
-    return docs
+    return inverted_index, vocab, doc_matrix, doc_norms
 
 
 # Main
 if __name__ == "__main__":
     # By default this program reads the docs.txt and queries.txt file in the same directory as it.
-    docs = read_file("docs.txt")
+    # The index built from docs.txt is saved to index.npz, and reused on later runs until docs.txt changes.
     queries = read_file("queries.txt")
-    docs = build_doc_dicts(docs)
-    corpus_dict = build_corpus_dict(docs)
-    index = build_inverted_index(docs, corpus_dict)
+    saved_index = load_index("index.npz", "docs.txt")
+    if saved_index is not None:
+        index, vocab, doc_matrix, doc_norms = saved_index
+    else:
+        # docs.txt is stat'ed before it is read, so if it changes during the build the saved index is already out of date
+        # If docs.txt can't be found, there is nothing to save the index against (read_file will report it)
+        try:
+            docs_stat = os.stat("docs.txt")
+        except OSError:
+            docs_stat = None
+        docs = read_file("docs.txt")
+        docs, vocab = build_doc_word_ids(docs)
+        index = build_inverted_index(docs, len(vocab))
+        doc_matrix = build_doc_matrix(docs, len(vocab))
+        doc_norms = build_doc_norms(doc_matrix)
+        if docs_stat is not None:
+            save_index("index.npz", docs_stat, vocab, doc_matrix, doc_norms)
     print(f"Words in dictionary: {len(index)}")
-    process_queries(queries, index, docs)
+    process_queries(queries, index, vocab, doc_matrix, doc_norms)